@@ -0,0 +1,33 @@
+from typing import List
+
+from fastapi import HTTPException, Response, status
+
+# Maximum number of ids accepted by the batch endpoints
+MAX_BATCH_SIZE = 1000
+
+
+def parse_ids(ids: str) -> List[int]:
+    """Parse a comma-separated list of ids (e.g. "1,2,3")"""
+    try:
+        parsed = [int(id_) for id_ in ids.split(",") if id_.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma-separated list of integers"
+        )
+    check_batch_size(parsed)
+    return parsed
+
+
+def check_batch_size(ids: List[int]) -> None:
+    if len(ids) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_SIZE} ids can be requested at once"
+        )
+
+
+def set_missing_ids_header(response: Response, missing: List[int]) -> None:
+    """Report ids that were not found on list responses"""
+    if missing:
+        response.headers["X-Missing-Ids"] = ",".join(str(id_) for id_ in missing)
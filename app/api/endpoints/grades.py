@@ -1,14 +1,58 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.api.batch import check_batch_size, parse_ids, set_missing_ids_header
+from app.api.versioning import expected_version, version_conflict
+from app.db.batch import BatchLoader, fetch_by_ids
 from app.db.database import get_db
-from app.db.models import Grade, Student, Subject
-from app.schemas.grade import Grade as GradeSchema, GradeCreate, GradeUpdate, GradeWithDetails
+from app.db.models import Grade, GradeHistory, Student, Subject
+from app.db.partitions import (
+    ArchivedSchoolYearError,
+    archive_school_year,
+    current_school_year,
+    ensure_grade_partition,
+)
+from app.db.versioning import VersionConflictError, versioned_update
+from app.schemas.batch import BatchGetRequest
+from app.schemas.grade import Grade as GradeSchema, GradeCreate, GradeUpdate, GradeEdit, GradeWithDetails, GradeBatch, SchoolYearArchive
 
 router = APIRouter()
 
 
+def _with_details(
+    db: Session,
+    grades: List[GradeHistory],
+    students: Optional[BatchLoader] = None,
+    subjects: Optional[BatchLoader] = None
+) -> List[GradeHistory]:
+    """Attach the student and subject of each grade: one query per model, whatever the number of grades"""
+    students = students or BatchLoader(db, Student)
+    subjects = subjects or BatchLoader(db, Subject)
+    for grade, student, subject in zip(
+        grades,
+        students.load_many([grade.student_id for grade in grades]),
+        subjects.load_many([grade.subject_id for grade in grades])
+    ):
+        set_committed_value(grade, "student", student)
+        set_committed_value(grade, "subject", subject)
+    return grades
+
+
+def _grade_not_writable(db: Session, grade_id: int) -> HTTPException:
+    """Error for a grade missing from the active table: archived (read-only) or not found"""
+    if db.query(GradeHistory.id).filter(GradeHistory.id == grade_id).first() is not None:
+        return HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Grade {grade_id} belongs to an archived school year"
+        )
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Grade {grade_id} not found"
+    )
+
+
 @router.post("/", response_model=GradeSchema, status_code=status.HTTP_201_CREATED)
 def create_grade(grade: GradeCreate, db: Session = Depends(get_db)):
     """Create a new grade for a student in a subject"""
@@ -28,11 +72,23 @@ def create_grade(grade: GradeCreate, db: Session = Depends(get_db)):
             detail="Subject not found"
         )
     
+    school_year = grade.school_year if grade.school_year is not None else current_school_year()
+    # Locks the school year until the commit below, so it cannot be archived in between
+    try:
+        ensure_grade_partition(db, school_year)
+    except ArchivedSchoolYearError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
     db_grade = Grade(
         student_id=grade.student_id,
         subject_id=grade.subject_id,
         value=grade.value,
-        comment=grade.comment
+        comment=grade.comment,
+        school_year=school_year,
+        term=grade.term
     )
     db.add(db_grade)
     db.commit()
@@ -42,42 +98,60 @@ def create_grade(grade: GradeCreate, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=List[GradeWithDetails])
 def read_grades(
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
     min_grade: Optional[float] = None,
     max_grade: Optional[float] = None,
+    school_year: Optional[int] = None,
+    term: Optional[int] = None,
+    ids: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all grades with optional filtering"""
-    query = db.query(Grade).options(
-        joinedload(Grade.student),
-        joinedload(Grade.subject)
-    )
+    """Get all grades with optional filtering, or the grades with the given ids (ids=1,2,3)"""
+    if ids is not None:
+        grades, missing = fetch_by_ids(db, GradeHistory, parse_ids(ids))
+        set_missing_ids_header(response, missing)
+        return _with_details(db, grades)
+    
+    # Archived school years included
+    query = db.query(GradeHistory)
+    
+    if school_year is not None:
+        query = query.filter(GradeHistory.school_year == school_year)
+    
+    if term is not None:
+        query = query.filter(GradeHistory.term == term)
     
     if min_grade is not None:
-        query = query.filter(Grade.value >= min_grade)
+        query = query.filter(GradeHistory.value >= min_grade)
     
     if max_grade is not None:
-        query = query.filter(Grade.value <= max_grade)
+        query = query.filter(GradeHistory.value <= max_grade)
     
     grades = query.offset(skip).limit(limit).all()
-    return grades
+    return _with_details(db, grades)
+
+
+@router.post("/batch-get", response_model=GradeBatch)
+def batch_get_grades(request: BatchGetRequest, db: Session = Depends(get_db)):
+    """Get several grades by ID in one query, in the requested order"""
+    check_batch_size(request.ids)
+    items, missing = fetch_by_ids(db, GradeHistory, request.ids)
+    return {"items": _with_details(db, items), "missing": missing}
 
 
 @router.get("/{grade_id}", response_model=GradeWithDetails)
 def read_grade(grade_id: int, db: Session = Depends(get_db)):
     """Get a specific grade by ID"""
-    db_grade = db.query(Grade).options(
-        joinedload(Grade.student),
-        joinedload(Grade.subject)
-    ).filter(Grade.id == grade_id).first()
+    db_grade = db.query(GradeHistory).filter(GradeHistory.id == grade_id).first()
     
     if db_grade is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Grade not found"
         )
-    return db_grade
+    return _with_details(db, [db_grade])[0]
 
 
 @router.get("/student/{student_id}", response_model=List[GradeWithDetails])
@@ -88,22 +162,19 @@ def read_student_grades(
     db: Session = Depends(get_db)
 ):
     """Get all grades for a specific student"""
-    # Check if student exists
-    student = db.query(Student).filter(Student.id == student_id).first()
-    if not student:
+    # Check if student exists (the loader then reuses it for the grade details)
+    students = BatchLoader(db, Student)
+    if students.load(student_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Student not found"
         )
     
-    grades = db.query(Grade).options(
-        joinedload(Grade.student),
-        joinedload(Grade.subject)
-    ).filter(
-        Grade.student_id == student_id
+    grades = db.query(GradeHistory).filter(
+        GradeHistory.student_id == student_id
     ).offset(skip).limit(limit).all()
     
-    return grades
+    return _with_details(db, grades, students=students)
 
 
 @router.get("/subject/{subject_id}", response_model=List[GradeWithDetails])
@@ -114,47 +185,69 @@ def read_subject_grades(
     db: Session = Depends(get_db)
 ):
     """Get all grades for a specific subject"""
-    # Check if subject exists
-    subject = db.query(Subject).filter(Subject.id == subject_id).first()
-    if not subject:
+    # Check if subject exists (the loader then reuses it for the grade details)
+    subjects = BatchLoader(db, Subject)
+    if subjects.load(subject_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Subject not found"
         )
     
-    grades = db.query(Grade).options(
-        joinedload(Grade.student),
-        joinedload(Grade.subject)
-    ).filter(
-        Grade.subject_id == subject_id
+    grades = db.query(GradeHistory).filter(
+        GradeHistory.subject_id == subject_id
     ).offset(skip).limit(limit).all()
     
-    return grades
+    return _with_details(db, grades, subjects=subjects)
 
 
 @router.put("/{grade_id}", response_model=GradeSchema)
 def update_grade(
     grade_id: int,
     grade: GradeUpdate,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Update a grade"""
-    db_grade = db.query(Grade).filter(Grade.id == grade_id).first()
-    if db_grade is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Grade not found"
-        )
-    
+    """Update a grade (409 if it was modified since the version given in the body or If-Match)"""
     # Update only the fields that are provided
     update_data = grade.dict(exclude_unset=True)
+    version = expected_version(update_data.pop("version", None), if_match)
     
-    for key, value in update_data.items():
-        setattr(db_grade, key, value)
+    try:
+        db_grade = versioned_update(db, Grade, grade_id, update_data, version)
+    except LookupError:
+        raise _grade_not_writable(db, grade_id)
+    except VersionConflictError as e:
+        raise version_conflict(GradeSchema, e)
     
+    result = GradeSchema.model_validate(db_grade, from_attributes=True)
     db.commit()
-    db.refresh(db_grade)
-    return db_grade
+    return result
+
+
+@router.patch("/", response_model=List[GradeSchema])
+def update_grades(edits: List[GradeEdit], db: Session = Depends(get_db)):
+    """Update several grades in one transaction (all or nothing, each edit must give its version)"""
+    check_batch_size(edits)
+    
+    results = []
+    for edit in edits:
+        update_data = edit.dict(exclude_unset=True)
+        grade_id = update_data.pop("id")
+        version = update_data.pop("version", None)
+        try:
+            db_grade = versioned_update(db, Grade, grade_id, update_data, version)
+        except LookupError:
+            db.rollback()
+            raise _grade_not_writable(db, grade_id)
+        except VersionConflictError as e:
+            # Build the response while the current row is still loaded
+            conflict = version_conflict(GradeSchema, e)
+            db.rollback()
+            raise conflict
+        results.append(GradeSchema.model_validate(db_grade, from_attributes=True))
+    
+    db.commit()
+    return results
 
 
 @router.delete("/{grade_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -162,11 +255,28 @@ def delete_grade(grade_id: int, db: Session = Depends(get_db)):
     """Delete a grade"""
     db_grade = db.query(Grade).filter(Grade.id == grade_id).first()
     if db_grade is None:
+        raise _grade_not_writable(db, grade_id)
+    
+    db.delete(db_grade)
+    db.commit()
+    return None
+
+
+@router.post("/archive/{school_year}", response_model=SchoolYearArchive)
+def archive_grades(school_year: int, db: Session = Depends(get_db)):
+    """Archive the grades of a past school year (still readable, but no longer editable)"""
+    if school_year >= current_school_year():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only past school years can be archived"
+        )
+    
+    try:
+        archive_school_year(db, school_year)
+    except LookupError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Grade not found"
+            detail=str(e)
         )
     
-    db.delete(db_grade)
-    db.commit()
-    return None
\ No newline at end of file
+    return SchoolYearArchive(school_year=school_year, archived=True)
@@ -1,12 +1,19 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from psycopg2.errors import UniqueViolation
 
+from app.api.batch import check_batch_size, parse_ids, set_missing_ids_header
+from app.api.versioning import expected_version, version_conflict
+from app.db.batch import fetch_by_ids
 from app.db.database import get_db
-from app.db.models import Student, Grade
-from app.schemas.student import Student as StudentSchema, StudentCreate, StudentUpdate
-from app.schemas.grade import StudentAverage
+from app.db.models import Student, GradeHistory
+from app.db.versioning import VersionConflictError, versioned_update
+from app.schemas.student import Student as StudentSchema, StudentCreate, StudentUpdate, StudentBatch
+from app.schemas.batch import BatchGetRequest
+from app.schemas.grade import StudentAverage, StudentPeriodAverage
 
 router = APIRouter()
 
@@ -34,12 +41,19 @@ def create_student(student: StudentCreate, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=List[StudentSchema])
 def read_students(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     search: Optional[str] = None,
+    ids: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all students with optional search"""
+    """Get all students with optional search, or the students with the given ids (ids=1,2,3)"""
+    if ids is not None:
+        students, missing = fetch_by_ids(db, Student, parse_ids(ids))
+        set_missing_ids_header(response, missing)
+        return students
+    
     query = db.query(Student)
     
     if search:
@@ -54,6 +68,14 @@ def read_students(
     return students
 
 
+@router.post("/batch-get", response_model=StudentBatch)
+def batch_get_students(request: BatchGetRequest, db: Session = Depends(get_db)):
+    """Get several students by ID in one query, in the requested order"""
+    check_batch_size(request.ids)
+    items, missing = fetch_by_ids(db, Student, request.ids)
+    return {"items": items, "missing": missing}
+
+
 @router.get("/{student_id}", response_model=StudentSchema)
 def read_student(student_id: int, db: Session = Depends(get_db)):
     """Get a specific student by ID"""
@@ -70,34 +92,36 @@ def read_student(student_id: int, db: Session = Depends(get_db)):
 def update_student(
     student_id: int, 
     student: StudentUpdate,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Update a student's information"""
-    db_student = db.query(Student).filter(Student.id == student_id).first()
-    if db_student is None:
+    """Update a student's information (409 if it was modified since the version given in the body or If-Match)"""
+    # Update only the fields that are provided
+    update_data = student.dict(exclude_unset=True)
+    version = expected_version(update_data.pop("version", None), if_match)
+    
+    try:
+        db_student = versioned_update(db, Student, student_id, update_data, version)
+    except LookupError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Student not found"
         )
+    except VersionConflictError as e:
+        raise version_conflict(StudentSchema, e)
+    except IntegrityError as e:
+        db.rollback()
+        # Only the unique email is reported; other violations are bugs
+        if not isinstance(e.orig, UniqueViolation) or e.orig.diag.constraint_name != "ix_students_email":
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
-    # Update only the fields that are provided
-    update_data = student.dict(exclude_unset=True)
-    
-    # If email is updated, check if the new email already exists
-    if "email" in update_data and update_data["email"] != db_student.email:
-        existing_email = db.query(Student).filter(Student.email == update_data["email"]).first()
-        if existing_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-    
-    for key, value in update_data.items():
-        setattr(db_student, key, value)
-    
+    result = StudentSchema.model_validate(db_student, from_attributes=True)
     db.commit()
-    db.refresh(db_student)
-    return db_student
+    return result
 
 
 @router.delete("/{student_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -126,8 +150,8 @@ def get_student_average(student_id: int, db: Session = Depends(get_db)):
             detail="Student not found"
         )
     
-    # Calculate the average
-    result = db.query(func.avg(Grade.value)).filter(Grade.student_id == student_id).scalar()
+    # Calculate the average (archived school years included)
+    result = db.query(func.avg(GradeHistory.value)).filter(GradeHistory.student_id == student_id).scalar()
     
     # Format the result
     average = result if result is not None else 0.0
@@ -136,4 +160,39 @@ def get_student_average(student_id: int, db: Session = Depends(get_db)):
         student_id=student_id,
         student_name=f"{db_student.first_name} {db_student.last_name}",
         overall_average=round(average, 2)
-    )
\ No newline at end of file
+    )
+
+
+@router.get("/{student_id}/average/{school_year}", response_model=StudentPeriodAverage)
+def get_student_period_average(
+    student_id: int,
+    school_year: int,
+    term: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Calculate the average grade for a student over a school year or one of its terms"""
+    db_student = db.query(Student).filter(Student.id == student_id).first()
+    if db_student is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student not found"
+        )
+    
+    # Only the partitions of the requested school year are scanned
+    query = db.query(func.avg(GradeHistory.value)).filter(
+        GradeHistory.student_id == student_id,
+        GradeHistory.school_year == school_year
+    )
+    if term is not None:
+        query = query.filter(GradeHistory.term == term)
+    result = query.scalar()
+    
+    average = result if result is not None else 0.0
+    
+    return StudentPeriodAverage(
+        student_id=student_id,
+        student_name=f"{db_student.first_name} {db_student.last_name}",
+        overall_average=round(average, 2),
+        school_year=school_year,
+        term=term
+    )
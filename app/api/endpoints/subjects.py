@@ -1,12 +1,19 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from psycopg2.errors import UniqueViolation
 
+from app.api.batch import check_batch_size, parse_ids, set_missing_ids_header
+from app.api.versioning import expected_version, version_conflict
+from app.db.batch import fetch_by_ids
 from app.db.database import get_db
-from app.db.models import Subject, Grade
-from app.schemas.subject import Subject as SubjectSchema, SubjectCreate, SubjectUpdate
-from app.schemas.grade import SubjectAverage
+from app.db.models import Subject, GradeHistory
+from app.db.versioning import VersionConflictError, versioned_update
+from app.schemas.subject import Subject as SubjectSchema, SubjectCreate, SubjectUpdate, SubjectBatch
+from app.schemas.batch import BatchGetRequest
+from app.schemas.grade import SubjectAverage, SubjectPeriodAverage
 
 router = APIRouter()
 
@@ -33,12 +40,19 @@ def create_subject(subject: SubjectCreate, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=List[SubjectSchema])
 def read_subjects(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     search: Optional[str] = None,
+    ids: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all subjects with optional search"""
+    """Get all subjects with optional search, or the subjects with the given ids (ids=1,2,3)"""
+    if ids is not None:
+        subjects, missing = fetch_by_ids(db, Subject, parse_ids(ids))
+        set_missing_ids_header(response, missing)
+        return subjects
+    
     query = db.query(Subject)
     
     if search:
@@ -52,6 +66,14 @@ def read_subjects(
     return subjects
 
 
+@router.post("/batch-get", response_model=SubjectBatch)
+def batch_get_subjects(request: BatchGetRequest, db: Session = Depends(get_db)):
+    """Get several subjects by ID in one query, in the requested order"""
+    check_batch_size(request.ids)
+    items, missing = fetch_by_ids(db, Subject, request.ids)
+    return {"items": items, "missing": missing}
+
+
 @router.get("/{subject_id}", response_model=SubjectSchema)
 def read_subject(subject_id: int, db: Session = Depends(get_db)):
     """Get a specific subject by ID"""
@@ -68,34 +90,36 @@ def read_subject(subject_id: int, db: Session = Depends(get_db)):
 def update_subject(
     subject_id: int, 
     subject: SubjectUpdate,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Update a subject"""
-    db_subject = db.query(Subject).filter(Subject.id == subject_id).first()
-    if db_subject is None:
+    """Update a subject (409 if it was modified since the version given in the body or If-Match)"""
+    # Update only the fields that are provided
+    update_data = subject.dict(exclude_unset=True)
+    version = expected_version(update_data.pop("version", None), if_match)
+    
+    try:
+        db_subject = versioned_update(db, Subject, subject_id, update_data, version)
+    except LookupError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Subject not found"
         )
+    except VersionConflictError as e:
+        raise version_conflict(SubjectSchema, e)
+    except IntegrityError as e:
+        db.rollback()
+        # Only the unique name is reported; other violations are bugs
+        if not isinstance(e.orig, UniqueViolation) or e.orig.diag.constraint_name != "ix_subjects_name":
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Subject name already exists"
+        )
     
-    # Update only the fields that are provided
-    update_data = subject.dict(exclude_unset=True)
-    
-    # If name is updated, check if the new name already exists
-    if "name" in update_data and update_data["name"] != db_subject.name:
-        existing_name = db.query(Subject).filter(Subject.name == update_data["name"]).first()
-        if existing_name:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Subject name already exists"
-            )
-    
-    for key, value in update_data.items():
-        setattr(db_subject, key, value)
-    
+    result = SubjectSchema.model_validate(db_subject, from_attributes=True)
     db.commit()
-    db.refresh(db_subject)
-    return db_subject
+    return result
 
 
 @router.delete("/{subject_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -124,8 +148,8 @@ def get_subject_average(subject_id: int, db: Session = Depends(get_db)):
             detail="Subject not found"
         )
     
-    # Calculate the average
-    result = db.query(func.avg(Grade.value)).filter(Grade.subject_id == subject_id).scalar()
+    # Calculate the average (archived school years included)
+    result = db.query(func.avg(GradeHistory.value)).filter(GradeHistory.subject_id == subject_id).scalar()
     
     # Format the result
     average = result if result is not None else 0.0
@@ -134,4 +158,39 @@ def get_subject_average(subject_id: int, db: Session = Depends(get_db)):
         subject_id=subject_id,
         subject_name=db_subject.name,
         average=round(average, 2)
-    )
\ No newline at end of file
+    )
+
+
+@router.get("/{subject_id}/average/{school_year}", response_model=SubjectPeriodAverage)
+def get_subject_period_average(
+    subject_id: int,
+    school_year: int,
+    term: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Calculate the average grade for a subject over a school year or one of its terms"""
+    db_subject = db.query(Subject).filter(Subject.id == subject_id).first()
+    if db_subject is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Subject not found"
+        )
+    
+    # Only the partitions of the requested school year are scanned
+    query = db.query(func.avg(GradeHistory.value)).filter(
+        GradeHistory.subject_id == subject_id,
+        GradeHistory.school_year == school_year
+    )
+    if term is not None:
+        query = query.filter(GradeHistory.term == term)
+    result = query.scalar()
+    
+    average = result if result is not None else 0.0
+    
+    return SubjectPeriodAverage(
+        subject_id=subject_id,
+        subject_name=db_subject.name,
+        average=round(average, 2),
+        school_year=school_year,
+        term=term
+    )
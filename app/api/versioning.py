@@ -0,0 +1,41 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+
+from app.db.versioning import VersionConflictError
+
+
+def expected_version(body_version: Optional[int], if_match: Optional[str]) -> Optional[int]:
+    """
+    Version the client read, from the request body or an `If-Match: "<version>"` header.
+
+    None (no version, or `If-Match: *`) means the update is not checked.
+    """
+    header_version = None
+    if if_match is not None and if_match.strip() != "*":
+        try:
+            header_version = int(if_match.strip().removeprefix("W/").strip('"'))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='If-Match must be a version, e.g. "3"'
+            )
+
+    if body_version is not None and header_version is not None and body_version != header_version:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="version and If-Match do not match"
+        )
+    return body_version if body_version is not None else header_version
+
+
+def version_conflict(schema, error: VersionConflictError) -> HTTPException:
+    """409 response carrying the current row, so the client can merge and retry"""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={
+            "message": "Modified by another user since it was read",
+            "current": jsonable_encoder(schema.model_validate(error.current, from_attributes=True)),
+        }
+    )
@@ -0,0 +1,63 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+# Range of the PostgreSQL integer ids: others cannot exist and are not queried
+# (binding them as INTEGER[] would fail with "integer out of range")
+MIN_ID = -2**31
+MAX_ID = 2**31 - 1
+
+
+def fetch_by_ids(
+    db: Session,
+    model,
+    ids: Sequence[int],
+    options: Iterable = ()
+) -> Tuple[List[Any], List[int]]:
+    """
+    Fetch rows of a model for a set of ids in a single query.
+
+    Returns the rows in the order of the requested ids and the list of ids
+    that were not found.
+    """
+    loader = BatchLoader(db, model, options)
+    rows = loader.load_many(ids)
+    found = [row for row in rows if row is not None]
+    missing = list(dict.fromkeys(id_ for id_, row in zip(ids, rows) if row is None))
+    return found, missing
+
+
+class BatchLoader:
+    """
+    DataLoader-style loader for a model, keyed by id.
+
+    Ids not loaded yet are resolved with one `id = ANY(:ids)` query, then kept
+    in a per-instance cache (create one loader per request / session). Ids out
+    of the integer range are reported missing without querying.
+    """
+
+    def __init__(self, db: Session, model, options: Iterable = ()):
+        self.db = db
+        self.model = model
+        self.options = list(options)
+        self._cache: Dict[int, Optional[Any]] = {}
+
+    def load_many(self, ids: Sequence[int]) -> List[Optional[Any]]:
+        """Return the rows for the given ids (None for missing ids), in order"""
+        pending = [id_ for id_ in dict.fromkeys(ids) if id_ not in self._cache]
+        for id_ in pending:
+            self._cache[id_] = None
+        queried = [id_ for id_ in pending if MIN_ID <= id_ <= MAX_ID]
+        if queried:
+            rows = self.db.query(self.model).options(*self.options).filter(
+                self.model.id == any_(bindparam("ids", queried, type_=ARRAY(Integer)))
+            ).all()
+            for row in rows:
+                self._cache[row.id] = row
+        return [self._cache[id_] for id_ in ids]
+
+    def load(self, id_: int) -> Optional[Any]:
+        """Return the row for an id, or None if it does not exist"""
+        return self.load_many([id_])[0]
@@ -0,0 +1,77 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db import models  # noqa: F401 (registers the tables on Base.metadata)
+from app.db.database import Base
+from app.db.partitions import SCHOOL_YEAR_START_MONTH, create_partition_sql
+
+# Advisory lock held while upgrading, so that concurrent workers do not race
+MIGRATION_LOCK_ID = 4242001
+
+# Tables created before optimistic versioning (create_all does not add columns)
+VERSIONED_TABLES = ("students", "subjects")
+
+# School year of a legacy grade, derived from its creation date
+LEGACY_SCHOOL_YEAR = (
+    "CAST(EXTRACT(YEAR FROM COALESCE(created_at, now())) AS integer) - "
+    f"CASE WHEN EXTRACT(MONTH FROM COALESCE(created_at, now())) >= {SCHOOL_YEAR_START_MONTH} "
+    "THEN 0 ELSE 1 END"
+)
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """
+    Create the tables and bring an existing database up to date.
+
+    Idempotent, runs at startup in a single transaction (DDL is transactional
+    in PostgreSQL): either the whole upgrade is applied or nothing is.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        legacy_grades = _rename_legacy_grades(conn)
+        Base.metadata.create_all(bind=conn)
+        if legacy_grades:
+            _copy_legacy_grades(conn)
+        for table in VERSIONED_TABLES:
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1"
+            ))
+
+
+def _rename_legacy_grades(conn: Connection) -> bool:
+    """
+    Move a non-partitioned "grades" table (created before partitioning by school
+    year) out of the way, so that the partitioned table can be created.
+    """
+    relkind = conn.execute(text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('grades')"
+    )).scalar()
+    if relkind != "r":
+        return False
+
+    # Index and sequence names are schema-wide: rename them along with the table
+    conn.execute(text("ALTER TABLE grades RENAME TO grades_legacy"))
+    conn.execute(text("ALTER INDEX IF EXISTS grades_pkey RENAME TO grades_legacy_pkey"))
+    conn.execute(text("ALTER INDEX IF EXISTS ix_grades_id RENAME TO ix_grades_legacy_id"))
+    conn.execute(text("ALTER SEQUENCE IF EXISTS grades_id_seq RENAME TO grades_legacy_id_seq"))
+    return True
+
+
+def _copy_legacy_grades(conn: Connection) -> None:
+    """Copy the legacy grades into the partitioned table, keeping their ids"""
+    years = conn.execute(text(
+        f"SELECT DISTINCT {LEGACY_SCHOOL_YEAR} FROM grades_legacy"
+    )).scalars().all()
+    for school_year in years:
+        conn.execute(create_partition_sql(school_year))
+
+    conn.execute(text(
+        "INSERT INTO grades (id, student_id, subject_id, value, comment, school_year, created_at, updated_at) "
+        f"SELECT id, student_id, subject_id, value, comment, {LEGACY_SCHOOL_YEAR}, created_at, updated_at "
+        "FROM grades_legacy"
+    ))
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('grades', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM grades"
+    ))
+    conn.execute(text("DROP TABLE grades_legacy"))
+    print(f"Migrated existing grades to the partitioned table ({len(years)} school years)")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, SmallInteger, String, Float, ForeignKey, DateTime, Index, Table, PrimaryKeyConstraint, select, union_all
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -12,6 +12,7 @@ class Student(Base):
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic locking
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -25,6 +26,7 @@ class Subject(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
     description = Column(String, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic locking
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -34,15 +36,64 @@ class Subject(Base):
 
 class Grade(Base):
     __tablename__ = "grades"
+    # Partitioned by school year (one partition per year, see app/db/partitions.py).
+    # PostgreSQL requires the partition key to be part of the primary key.
+    __table_args__ = (
+        Index("ix_grades_student_period", "student_id", "school_year", "term"),
+        Index("ix_grades_subject_period", "subject_id", "school_year", "term"),
+        {"postgresql_partition_by": "LIST (school_year)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
     value = Column(Float, nullable=False)  # The actual grade (e.g., 15.5)
     comment = Column(String, nullable=True)
+    school_year = Column(SmallInteger, primary_key=True)  # First calendar year, e.g. 2024 for 2024-2025
+    term = Column(SmallInteger, nullable=True)  # Trimester / period within the school year
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic locking
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     student = relationship("Student", back_populates="grades")
-    subject = relationship("Subject", back_populates="grades")
\ No newline at end of file
+    subject = relationship("Subject", back_populates="grades")
+
+
+# Parent table for school years detached from "grades" by the archive operation.
+# Same columns as "grades" so that partitions can be moved between both parents.
+grades_archive = Table(
+    "grades_archive",
+    Base.metadata,
+    Column("id", Integer, nullable=False),
+    Column("student_id", Integer, nullable=False),
+    Column("subject_id", Integer, nullable=False),
+    Column("value", Float, nullable=False),
+    Column("comment", String, nullable=True),
+    Column("school_year", SmallInteger, nullable=False),
+    Column("term", SmallInteger, nullable=True),
+    Column("version", Integer, nullable=False, server_default="1"),
+    Column("created_at", DateTime(timezone=True)),
+    Column("updated_at", DateTime(timezone=True)),
+    PrimaryKeyConstraint("id", "school_year"),
+    postgresql_partition_by="LIST (school_year)",
+)
+
+
+# All grades, active and archived. Reads go through this so that archiving a
+# school year does not change what the API returns; filters on school_year are
+# pushed down to both parents and prune their partitions.
+grade_history = union_all(
+    select(*Grade.__table__.c),
+    select(*[grades_archive.c[column.name] for column in Grade.__table__.c]),
+).subquery("grade_history")
+
+
+class GradeHistory(Base):
+    """Read-only view of active and archived grades"""
+    __table__ = grade_history
+    __mapper_args__ = {"primary_key": [grade_history.c.id, grade_history.c.school_year]}
+
+    # Relationships
+    student = relationship("Student", primaryjoin="foreign(GradeHistory.student_id) == Student.id", viewonly=True)
+    subject = relationship("Subject", primaryjoin="foreign(GradeHistory.subject_id) == Subject.id", viewonly=True)
@@ -0,0 +1,111 @@
+import os
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Tablespace used for archived school years (e.g. on cheaper storage).
+# If not set, archived partitions stay in the default tablespace.
+ARCHIVE_TABLESPACE = os.getenv("ARCHIVE_TABLESPACE")
+
+# First month of the school year (September)
+SCHOOL_YEAR_START_MONTH = 9
+
+# Grades can be recorded this many school years before/after the current one.
+# Keeps clients from creating partitions for arbitrary years.
+SCHOOL_YEAR_WINDOW = 1
+
+# Advisory lock namespace for the partition of a school year (second key: the year)
+PARTITION_LOCK_ID = 4242002
+
+
+class ArchivedSchoolYearError(Exception):
+    """Raised when writing to a school year that has been archived"""
+
+
+def current_school_year(today: Optional[date] = None) -> int:
+    """Return the school year of a date, identified by its first calendar year"""
+    today = today or date.today()
+    return today.year if today.month >= SCHOOL_YEAR_START_MONTH else today.year - 1
+
+
+def is_open_school_year(school_year: int) -> bool:
+    """Whether grades can be recorded for a school year"""
+    return abs(school_year - current_school_year()) <= SCHOOL_YEAR_WINDOW
+
+
+def partition_name(school_year: int) -> str:
+    return f"grades_y{int(school_year)}"
+
+
+def create_partition_sql(school_year: int):
+    return text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(school_year)} "
+        f"PARTITION OF grades FOR VALUES IN ({int(school_year)})"
+    )
+
+
+def _lock_school_year(db: Session, school_year: int) -> None:
+    """Serialize partition creation, inserts and archiving of a school year until commit"""
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(:lock_id, :school_year)"),
+        {"lock_id": PARTITION_LOCK_ID, "school_year": int(school_year)},
+    )
+
+
+def _partition_parent(db: Session, school_year: int) -> Optional[str]:
+    """Return the parent table of a school year partition, or None if it does not exist"""
+    # to_regclass resolves the name through the search_path, like the DDL below
+    return db.execute(
+        text(
+            "SELECT parent.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE pg_inherits.inhrelid = to_regclass(:name)"
+        ),
+        {"name": partition_name(school_year)},
+    ).scalar()
+
+
+def ensure_grade_partition(db: Session, school_year: int) -> None:
+    """
+    Create the partition of the grades table for a school year if needed.
+
+    Takes a transaction-level lock on the school year, held until the caller
+    commits its insert: the year cannot be archived, nor its partition created
+    concurrently, between this check and the insert.
+    """
+    _lock_school_year(db, school_year)
+    parent = _partition_parent(db, school_year)
+    if parent == "grades_archive":
+        raise ArchivedSchoolYearError(f"School year {school_year} is archived")
+
+    if parent is None:
+        db.execute(create_partition_sql(school_year))
+
+
+def archive_school_year(db: Session, school_year: int) -> None:
+    """
+    Move a school year out of the grades table.
+
+    The partition is detached from "grades", moved to the archive tablespace and
+    attached to "grades_archive", so it stays queryable without weighing on the
+    indexes and scans of the active table.
+    """
+    _lock_school_year(db, school_year)
+    parent = _partition_parent(db, school_year)
+    if parent is None:
+        raise LookupError(f"No grades for school year {school_year}")
+    if parent == "grades_archive":
+        return
+
+    name = partition_name(school_year)
+    db.execute(text(f"ALTER TABLE grades DETACH PARTITION {name}"))
+    if ARCHIVE_TABLESPACE:
+        db.execute(text(f'ALTER TABLE {name} SET TABLESPACE "{ARCHIVE_TABLESPACE}"'))
+    db.execute(text(
+        f"ALTER TABLE grades_archive ATTACH PARTITION {name} "
+        f"FOR VALUES IN ({int(school_year)})"
+    ))
+    db.commit()
+
@@ -0,0 +1,45 @@
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+
+class VersionConflictError(Exception):
+    """Raised when a row was modified since the version the client read"""
+
+    def __init__(self, current):
+        super().__init__(f"Version conflict: current version is {current.version}")
+        self.current = current
+
+
+def versioned_update(
+    db: Session,
+    model,
+    id_: int,
+    values: Dict[str, Any],
+    version: Optional[int] = None
+):
+    """
+    Update a row in a single `UPDATE ... WHERE id = :id AND version = :v RETURNING *`.
+
+    The version is incremented on every update. When `version` is None the row is
+    updated whatever its current version. The transaction is not committed.
+    The returned row is complete: callers serialize it before committing, as
+    the commit would expire it and a refresh would cost another SELECT.
+    Raises LookupError if the row does not exist and VersionConflictError if it
+    was modified concurrently.
+    """
+    stmt = update(model).where(model.id == id_)
+    if version is not None:
+        stmt = stmt.where(model.version == version)
+    stmt = stmt.values(**values, version=model.version + 1).returning(model)
+
+    row = db.scalars(stmt).first()
+    if row is not None:
+        return row
+
+    # Nothing updated: find out why (only on the failure path)
+    current = db.query(model).filter(model.id == id_).first()
+    if current is None:
+        raise LookupError(f"{model.__name__} {id_} not found")
+    raise VersionConflictError(current)
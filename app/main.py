@@ -2,7 +2,9 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
-from app.db.database import engine, Base
+from app.db.database import engine, SessionLocal
+from app.db.migrations import upgrade_schema
+from app.db.partitions import current_school_year, ensure_grade_partition
 from app.api.endpoints import students, subjects, grades
 
 app = FastAPI(
@@ -18,6 +20,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Missing-Ids"],  # Ids not found by GET /<entity>?ids=
 )
 
 # Include routers
@@ -40,10 +43,17 @@ def read_root():
 
 @app.on_event("startup")
 async def startup_db_client():
-    # Créer les tables de la base de données au démarrage
+    # Créer les tables de la base de données au démarrage (et migrer une base existante)
     try:
-        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
         print("Database tables created successfully")
+        # Partition des notes pour l'année scolaire en cours
+        db = SessionLocal()
+        try:
+            ensure_grade_partition(db, current_school_year())
+            db.commit()
+        finally:
+            db.close()
     except Exception as e:
         print(f"Error creating database tables: {e}")
 
@@ -0,0 +1,6 @@
+from typing import List
+from pydantic import BaseModel
+
+
+class BatchGetRequest(BaseModel):
+    ids: List[int]
@@ -1,9 +1,11 @@
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import Optional, List
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 
+from app.db.partitions import SCHOOL_YEAR_WINDOW, is_open_school_year
 from app.schemas.student import Student
 from app.schemas.subject import Subject
+from app.schemas.validators import not_null
 
 
 class GradeBase(BaseModel):
@@ -14,16 +16,38 @@ class GradeBase(BaseModel):
 
 
 class GradeCreate(GradeBase):
-    pass
+    school_year: Optional[int] = None  # Defaults to the current school year
+    term: Optional[int] = Field(None, ge=1, le=3)  # Trimester
+
+    @field_validator("school_year")
+    @classmethod
+    def check_school_year(cls, value: Optional[int]) -> Optional[int]:
+        if value is not None and not is_open_school_year(value):
+            raise ValueError(
+                f"school_year must be within {SCHOOL_YEAR_WINDOW} year(s) of the current school year"
+            )
+        return value
 
 
 class GradeUpdate(BaseModel):
     value: Optional[float] = Field(None, ge=0, le=20)
     comment: Optional[str] = None
+    term: Optional[int] = Field(None, ge=1, le=3)  # Trimester
+    version: Optional[int] = None  # Version read by the client, checked on update
+
+    _not_null = field_validator("value")(not_null)
+
+
+class GradeEdit(GradeUpdate):
+    id: int
+    version: int  # Required: batch edits are always checked
 
 
 class Grade(GradeBase):
     id: int
+    version: int
+    school_year: int
+    term: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -39,13 +63,33 @@ class GradeWithDetails(Grade):
         orm_mode = True
 
 
+class GradeBatch(BaseModel):
+    items: List[GradeWithDetails]
+    missing: List[int]
+
+
 class StudentAverage(BaseModel):
     student_id: int
     student_name: str
     overall_average: float
 
 
+class StudentPeriodAverage(StudentAverage):
+    school_year: int
+    term: Optional[int] = None
+
+
 class SubjectAverage(BaseModel):
     subject_id: int
     subject_name: str
-    average: float
\ No newline at end of file
+    average: float
+
+
+class SubjectPeriodAverage(SubjectAverage):
+    school_year: int
+    term: Optional[int] = None
+
+
+class SchoolYearArchive(BaseModel):
+    school_year: int
+    archived: bool
\ No newline at end of file
@@ -1,7 +1,9 @@
 from typing import Optional, List
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from datetime import datetime
 
+from app.schemas.validators import not_null
+
 
 class StudentBase(BaseModel):
     first_name: str
@@ -17,12 +19,21 @@ class StudentUpdate(BaseModel):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     email: Optional[EmailStr] = None
+    version: Optional[int] = None  # Version read by the client, checked on update
+
+    _not_null = field_validator("first_name", "last_name", "email")(not_null)
 
 
 class Student(StudentBase):
     id: int
+    version: int
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class StudentBatch(BaseModel):
+    items: List[Student]
+    missing: List[int]
\ No newline at end of file
@@ -1,7 +1,9 @@
-from typing import Optional
-from pydantic import BaseModel
+from typing import Optional, List
+from pydantic import BaseModel, field_validator
 from datetime import datetime
 
+from app.schemas.validators import not_null
+
 
 class SubjectBase(BaseModel):
     name: str
@@ -15,12 +17,21 @@ class SubjectCreate(SubjectBase):
 class SubjectUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
+    version: Optional[int] = None  # Version read by the client, checked on update
+
+    _not_null = field_validator("name")(not_null)
 
 
 class Subject(SubjectBase):
     id: int
+    version: int
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class SubjectBatch(BaseModel):
+    items: List[Subject]
+    missing: List[int]
\ No newline at end of file
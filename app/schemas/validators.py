@@ -0,0 +1,5 @@
+def not_null(cls, value):
+    """Field validator for update schemas: Optional means "may be omitted", not "may be set to null" """
+    if value is None:
+        raise ValueError("may not be null")
+    return value
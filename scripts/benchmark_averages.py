@@ -0,0 +1,118 @@
+"""
+Benchmark des requêtes de moyenne avec 10 années d'historique.
+
+Compare la table des notes partitionnée par année scolaire (requêtes de l'API,
+via GradeHistory) à une table non partitionnée contenant les mêmes lignes et
+les mêmes index. Tout est créé dans un schéma jetable ("bench") de la base
+configurée (DATABASE_URL), supprimé à la fin : le script peut être relancé.
+
+    python -m scripts.benchmark_averages --students 1000 --grades-per-year 40
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import MetaData, Table, create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import DATABASE_URL, Base
+from app.db.models import GradeHistory
+from app.db.partitions import create_partition_sql, current_school_year
+
+SCHEMA = "bench"
+YEARS = 10
+TERMS = 3
+
+
+def seed(db, students, subjects, grades_per_year):
+    """Fill the partitioned grades table, then copy it to an unpartitioned one"""
+    db.execute(text(
+        "INSERT INTO students (first_name, last_name, email) "
+        "SELECT 'Bench', i::text, 'bench' || i || '@example.com' FROM generate_series(1, :n) i"
+    ), {"n": students})
+    db.execute(text(
+        "INSERT INTO subjects (name) SELECT 'Subject ' || i FROM generate_series(1, :n) i"
+    ), {"n": subjects})
+
+    first_year = current_school_year() - YEARS + 1
+    for school_year in range(first_year, first_year + YEARS):
+        db.execute(create_partition_sql(school_year))
+    db.execute(text(
+        "INSERT INTO grades (student_id, subject_id, value, school_year, term) "
+        "SELECT s.id, 1 + (random() * (:subjects - 1))::int, round((random() * 20)::numeric, 1), "
+        "y, 1 + (random() * (:terms - 1))::int "
+        "FROM students s, generate_series(:first, :last) y, generate_series(1, :per_year) n"
+    ), {"subjects": subjects, "terms": TERMS, "first": first_year,
+        "last": first_year + YEARS - 1, "per_year": grades_per_year})
+
+    # INCLUDING ALL copies the indexes of grades (same indexes on both tables)
+    db.execute(text("CREATE TABLE grades_flat (LIKE grades INCLUDING ALL)"))
+    db.execute(text("INSERT INTO grades_flat SELECT * FROM grades"))
+    db.commit()
+    db.execute(text("ANALYZE"))
+    return first_year + YEARS - 1
+
+
+def timed(db, query, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        db.execute(query).scalar()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--subjects", type=int, default=12)
+    parser.add_argument("--grades-per-year", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=100)
+    args = parser.parse_args()
+
+    admin = create_engine(DATABASE_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+
+    engine = create_engine(DATABASE_URL, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    db = sessionmaker(bind=engine)()
+    try:
+        Base.metadata.create_all(bind=engine)
+        last_year = seed(db, args.students, args.subjects, args.grades_per_year)
+        flat = Table("grades_flat", MetaData(), autoload_with=engine)
+        partitioned = GradeHistory.__table__
+        rows = db.execute(text("SELECT count(*) FROM grades")).scalar()
+
+        def average(table, student_id=None, subject_id=None, school_year=None, term=None):
+            query = select(func.avg(table.c.value))
+            for column, value in (("student_id", student_id), ("subject_id", subject_id),
+                                  ("school_year", school_year), ("term", term)):
+                if value is not None:
+                    query = query.where(table.c[column] == value)
+            return query
+
+        series = [
+            ("student, all years", dict(student_id=1)),
+            (f"student, {last_year}", dict(student_id=1, school_year=last_year)),
+            (f"student, {last_year} term 2", dict(student_id=1, school_year=last_year, term=2)),
+            ("subject, all years", dict(subject_id=1)),
+            (f"subject, {last_year}", dict(subject_id=1, school_year=last_year)),
+            (f"subject, {last_year} term 2", dict(subject_id=1, school_year=last_year, term=2)),
+        ]
+
+        print(f"{rows} grades over {YEARS} school years, median of {args.runs} runs")
+        print(f"{'average':<28}{'unpartitioned':>15}{'partitioned':>15}")
+        for label, filters in series:
+            flat_ms = timed(db, average(flat, **filters), args.runs)
+            partitioned_ms = timed(db, average(partitioned, **filters), args.runs)
+            print(f"{label:<28}{flat_ms:>12.2f} ms{partitioned_ms:>12.2f} ms")
+    finally:
+        db.close()
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()